@@ -0,0 +1,218 @@
+# benchmark_suite.py
+import os
+import io
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import platform
+import tempfile
+import contextlib
+from unittest import mock   #stubs the retrain check out of the update_today benchmark
+import tracemalloc      #peak memory per benchmark
+import numpy as np
+from user_profile import UserProfile
+from rag_retriever import RAGRetriever
+from recommender import recommend_goals
+from health_agent import HealthCoachAgent
+from ml_models import train_fatigue_model_from_logs, fatigue_feature_vector
+from model_cache import ModelCache, get_fatigue_model
+from synthetic_data import synthetic_entry, write_synthetic_csv
+import user_profile
+import bulk_import
+
+#Repeatable end-to-end benchmarks on synthetic data in an isolated temp store
+#(the real logs.json and models are never touched). Results are JSON so two
+#runs can be compared with --compare.
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources")
+QUERIES = [
+    "how to improve sleep",
+    "how much water should I drink",
+    "how to reduce stress",
+    "how to increase daily steps",
+    "tips for better hydration",
+    "what to do when feeling tired",
+]
+
+
+class _StubLLM:
+    """Stands in for GPT4All so advice generation can be timed without a model file."""
+    def generate(self, prompt, max_tokens=250):
+        bullets = [l for l in prompt.splitlines() if l and not l.endswith(":")][:6]
+        return "\n".join("- " + b for b in bullets)
+
+
+# --------------------------- synthetic data ---------------------------
+
+def _write_corpus(resources_path, n_docs, rng):
+    # documents are shuffled sentences from the bundled resources, so TF-IDF sees realistic vocabulary
+    sentences = []
+    if os.path.isdir(RESOURCES_DIR):
+        for f in sorted(os.listdir(RESOURCES_DIR)):
+            if f.endswith(".txt"):
+                with open(os.path.join(RESOURCES_DIR, f), "r", encoding="utf-8") as fh:
+                    sentences += [s.strip() for s in re.split(r"(?<=[.!?])\s+", fh.read()) if s.strip()]
+    if not sentences:
+        sentences = ["Drink water regularly.", "Sleep seven to nine hours.", "Walk every day."]
+    os.makedirs(resources_path, exist_ok=True)
+    for i in range(n_docs):
+        picked = rng.choice(len(sentences), size=min(20, len(sentences)), replace=False)
+        with open(os.path.join(resources_path, f"doc_{i:05d}.txt"), "w", encoding="utf-8") as fh:
+            fh.write(" ".join(sentences[j] for j in picked))
+
+def generate_synthetic_data(root, n_users=20, n_days=180, corpus_docs=50, seed=0):
+    """
+    Create logs.json (n_users x n_days daily entries) and a resources/ corpus under root.
+    Returns the paths and user ids used by the benchmarks.
+    """
+    rng = np.random.default_rng(seed)
+    log_path = os.path.join(root, "logs.json")
+    resources_path = os.path.join(root, "resources")
+    model_path = os.path.join(root, "models", "fatigue_model.pkl")
+    user_ids = [f"bench_user_{i}" for i in range(n_users)]
+
+    start = datetime.datetime.utcnow() - datetime.timedelta(days=n_days)
+    entries = {
+        uid: [synthetic_entry(rng, start + datetime.timedelta(days=d)) for d in range(n_days)]
+        for uid in user_ids
+    }
+    profile = UserProfile(user_id=user_ids[0], log_path=log_path)
+    profile.add_entries(entries)      #one write for the whole dataset
+    _write_corpus(resources_path, corpus_docs, rng)
+    return {"log_path": log_path, "resources_path": resources_path, "model_path": model_path, "user_ids": user_ids}
+
+
+# --------------------------- measurement ---------------------------
+
+def _measure(fn, repeat, warmup=2):
+    """Run fn repeatedly; latency percentiles, throughput and peak traced memory of one extra call."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    # memory is traced on a separate call so tracemalloc overhead doesn't skew the timings
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    ms = np.array(times) * 1000
+    return {
+        "runs": repeat,
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "throughput_per_s": round(repeat / sum(times), 2) if sum(times) else None,
+        "peak_mem_kb": round(peak / 1024, 1),
+    }
+
+def run_benchmarks(n_users=20, n_days=180, corpus_docs=50, repeat=50, seed=0, import_rows=1000):
+    random.seed(seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as root, contextlib.redirect_stdout(io.StringIO()):
+        paths = generate_synthetic_data(root, n_users, n_days, corpus_docs, seed)
+        uid = paths["user_ids"][0]
+        profile = UserProfile(user_id=uid, log_path=paths["log_path"])
+        rng = np.random.default_rng(seed)
+        now = datetime.datetime.utcnow()
+
+        # the app's write path; the retrain check is stubbed out here and measured by benchmark_training.py
+        def storage_update_today():
+            e = synthetic_entry(rng, now)
+            profile.update_today(e["steps"], e["sleep"], e["water"], e["mood"])
+
+        with mock.patch.object(user_profile, "retrain_if_needed", lambda profile: None):
+            results["storage_update_today"] = _measure(storage_update_today, repeat)
+
+        # the bulk write path: a fresh export per call (warmup + repeat + the memory run)
+        exports = []
+        for i in range(repeat + 3):
+            path = os.path.join(root, f"export_{i}.csv")
+            write_synthetic_csv(path, rng, paths["user_ids"], import_rows,
+                                now + datetime.timedelta(days=i + 1), step=datetime.timedelta(seconds=1))
+            exports.append(path)
+        results["bulk_import"] = _measure(
+            lambda: bulk_import.import_file(exports.pop(), log_path=paths["log_path"], retrain=False), repeat)
+        results["get_history_7d"] = _measure(lambda: profile.get_history(days=7), repeat)
+        results["get_history_frame"] = _measure(lambda: profile.get_history_frame(), repeat)
+
+        rag = RAGRetriever(resources_path=paths["resources_path"])
+        results["retrieve"] = _measure(lambda: rag.retrieve(random.choice(QUERIES), top_k=3), repeat)
+
+        goals = profile.get_goals()
+        results["recommend_goals"] = _measure(lambda: recommend_goals(profile.get_history(days=7), goals), repeat)
+
+        train_repeat = max(3, repeat // 10)
+        results["fatigue_train_full"] = _measure(
+            lambda: train_fatigue_model_from_logs(paths["log_path"], save_path=paths["model_path"]), train_repeat, warmup=1)
+
+        cache = ModelCache()
+        entry = {"steps": 6000, "sleep": 6.5, "water": 1.5, "mood": "Tired"}
+        def fatigue_inference():
+            model, features, _ = get_fatigue_model(uid, base_path=paths["model_path"], cache=cache)
+            model.predict(fatigue_feature_vector(entry, features))
+        results["fatigue_inference"] = _measure(fatigue_inference, repeat)    #warm: cache hits after the first call
+
+        def fatigue_inference_cold():
+            cache.clear()            #every call unpickles the model from disk, like a first request or after eviction
+            fatigue_inference()
+        results["fatigue_inference_cold"] = _measure(fatigue_inference_cold, repeat)
+
+        agent = HealthCoachAgent(profile, rag=rag, llm_path=None, model_path=paths["model_path"])
+        agent.llm = _StubLLM()
+        metrics = {"steps": 4000, "sleep": 6, "water": 1.2, "mood": "Okay"}
+        results["generate_advice"] = _measure(lambda: agent.generate_advice(metrics), repeat)
+
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "config": {"users": n_users, "days": n_days, "corpus_docs": corpus_docs, "repeat": repeat, "seed": seed,
+                       "import_rows": import_rows},
+        },
+        "results": results,
+    }
+
+def compare(baseline, current):
+    """Percent change of p50/p95 per benchmark (positive = slower than baseline)."""
+    diff = {}
+    for name, cur in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        diff[name] = {
+            k: round((cur[k] - old[k]) / old[k] * 100, 1) if old[k] else None
+            for k in ("p50_ms", "p95_ms")
+        }
+    return diff
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark storage, retrieval, training and advice generation")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--corpus-docs", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--import-rows", type=int, default=1000, help="rows per export in the bulk_import benchmark")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="previous JSON report to diff against")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.users, args.days, args.corpus_docs, args.repeat, args.seed, args.import_rows)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            report["compare_pct"] = compare(json.load(f), report)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
@@ -0,0 +1,43 @@
+# benchmark_training.py
+import os
+import io
+import time
+import argparse
+import datetime
+import tempfile
+import contextlib
+import numpy as np
+from user_profile import UserProfile
+from continuous_learning import retrain_if_needed
+from synthetic_data import simulated_day
+
+#Cumulative fatigue-model training time over simulated months of daily logs,
+#full retrains vs incremental updates. Everything is written to a temp directory.
+
+def run_training_benchmark(mode, months=12, users=5, seed=0):
+    rng = np.random.default_rng(seed)
+    user_ids = [f"sim_user_{i}" for i in range(users)]
+    start = datetime.datetime(2024, 1, 1)
+    monthly = []
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = os.path.join(tmp, "logs.json")
+        model_path = os.path.join(tmp, "models", "fatigue_model.pkl")
+        profile = UserProfile(user_id=user_ids[0], log_path=log_path)
+        total = 0.0
+        for day in range(months * 30):
+            profile.add_entries(simulated_day(rng, day, user_ids, start))
+            with contextlib.redirect_stdout(io.StringIO()):    #keep the retrain prints out of the report
+                t0 = time.perf_counter()
+                retrain_if_needed(profile, mode=mode, model_path=model_path)
+                total += time.perf_counter() - t0
+            if (day + 1) % 30 == 0:
+                monthly.append(round(total, 3))
+    return {"mode": mode, "months": months, "users": users, "cumulative_seconds_by_month": monthly}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full vs incremental fatigue model retraining")
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--users", type=int, default=5)
+    args = parser.parse_args()
+    for mode in ("full", "incremental"):
+        print(run_training_benchmark(mode, months=args.months, users=args.users))
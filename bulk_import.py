@@ -0,0 +1,200 @@
+# bulk_import.py
+import os
+import sqlite3           #on-disk (user_id, timestamp) index for dedupe
+import argparse
+import tempfile
+import pandas as pd      #chunked CSV/JSONL reading and vectorized cleaning
+from user_profile import UserProfile
+from continuous_learning import retrain_if_needed
+from history_store import load_logs, append_journal, timestamp_us
+
+#Streams large wearable exports (CSV or JSONL) into the profile store chunk by chunk.
+#Only one chunk of the input is in memory at a time: each chunk is appended to the
+#import journal (see history_store) with one write, and the dedupe keys live in a
+#SQLite file rather than in memory. The journal is folded into logs.json by the next
+#UserProfile that saves. compact=True (--compact) does that right away, but it loads
+#and rewrites the whole store, so it costs memory in proportion to the store, not
+#the chunk. The fatigue model retrain check also works on the loaded store.
+
+REQUIRED_COLUMNS = ["timestamp", "steps", "sleep", "water"]
+
+#wearable exports use different column names for the same thing
+COLUMN_ALIASES = {
+    "user": "user_id",
+    "userid": "user_id",
+    "date": "timestamp",
+    "datetime": "timestamp",
+    "time": "timestamp",
+    "step_count": "steps",
+    "sleep_hours": "sleep",
+    "water_intake": "water",
+    "water_l": "water",
+}
+
+#same limits as the number inputs in streamlit_app.py
+LIMITS = {"steps": (0, None), "sleep": (0.0, 24.0), "water": (0.0, 10.0)}
+
+#numeric timestamps are unix epochs; the unit is told apart by magnitude (both ranges start in 2001).
+#smaller numbers (e.g. 20240101 or row counters) would land in 1970 and are rejected instead
+EPOCH_UNITS = {"s": (1e9, 1e11), "ms": (1e12, 1e14)}
+
+
+def _detect_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    return "csv"
+
+
+def _read_chunks(path, fmt, chunk_size):
+    if fmt == "jsonl":
+        # dtype=False keeps pandas from guessing types; coercion happens in _clean_chunk
+        return pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False)
+    return pd.read_csv(path, chunksize=chunk_size, dtype=str)
+
+
+def _parse_timestamps(raw):
+    """Date strings and unix epochs (seconds or milliseconds) -> UTC datetimes, NaT when invalid."""
+    numeric = pd.to_numeric(raw, errors="coerce")
+    is_num = numeric.notna()
+    parsed = pd.to_datetime(raw.where(~is_num), errors="coerce", utc=True, format="mixed")
+    parsed = parsed.astype("datetime64[ns, UTC]")
+    parsed[is_num] = pd.NaT
+    for unit, (lo, hi) in EPOCH_UNITS.items():
+        sel = is_num & (numeric.abs() >= lo) & (numeric.abs() < hi)
+        if sel.any():
+            parsed[sel] = pd.to_datetime(numeric[sel], unit=unit, utc=True)
+    return parsed
+
+
+def _clean_chunk(df, default_user_id):
+    """
+    Normalise column names, coerce types and drop invalid rows for one chunk.
+    Returns (clean_df, number_of_rejected_rows).
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    df = df.rename(columns=COLUMN_ALIASES)
+
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"missing required columns: {missing}")
+
+    total = len(df)
+    if "user_id" not in df.columns:
+        df["user_id"] = default_user_id
+    if "mood" not in df.columns:
+        df["mood"] = "Neutral"
+
+    out = pd.DataFrame({
+        "user_id": df["user_id"].astype("string").str.strip().fillna(default_user_id),
+        "timestamp": _parse_timestamps(df["timestamp"]),
+        "steps": pd.to_numeric(df["steps"], errors="coerce"),
+        "sleep": pd.to_numeric(df["sleep"], errors="coerce"),
+        "water": pd.to_numeric(df["water"], errors="coerce"),
+        "mood": df["mood"].astype("string").str.strip().str.capitalize().fillna("Neutral"),
+    })
+    out.loc[out["user_id"] == "", "user_id"] = default_user_id
+    out.loc[out["mood"] == "", "mood"] = "Neutral"
+
+    valid = out[["timestamp", "steps", "sleep", "water"]].notna().all(axis=1)
+    for col, (lo, hi) in LIMITS.items():
+        if lo is not None:
+            valid &= out[col] >= lo
+        if hi is not None:
+            valid &= out[col] <= hi
+    out = out[valid]
+
+    # stored timestamps are naive UTC isoformat strings (see UserProfile.update_today)
+    ts = out["timestamp"].dt.tz_convert(None)
+    out = out.assign(
+        timestamp=ts.dt.strftime("%Y-%m-%dT%H:%M:%S.%f").str.replace(r"\.000000$", "", regex=True),
+        steps=out["steps"].round().astype("int64"),
+        sleep=out["sleep"].astype("float64"),
+        water=out["water"].astype("float64"),
+    )
+    out["ts_key"] = ts.to_numpy().astype("datetime64[us]").astype("int64")   #same key as history_store.timestamp_us
+    return out, total - int(valid.sum())
+
+
+def _seed_index(conn, log_path):
+    # keys of rows already in the store; the parsed store is released before the input is read
+    data = load_logs(log_path)
+    for uid, ud in data.get("users", {}).items():
+        keys = ((uid, timestamp_us(h.get("timestamp"))) for h in ud.get("history", []))
+        conn.executemany("INSERT OR IGNORE INTO seen VALUES (?, ?)", ((u, k) for u, k in keys if k is not None))
+    conn.commit()
+
+
+def import_file(path, log_path="C:/Users/Sithumi/src/data/logs.json", fmt=None,
+                chunk_size=5000, default_user_id="user_1", retrain=True, compact=False):
+    """
+    Import a CSV/JSONL export into the profile store.
+    Rows are deduplicated on (user_id, timestamp) against the store, earlier chunks and
+    earlier rows of the same chunk. Rows stay in the journal (UserProfile merges it on
+    load and folds it into logs.json on its next save); compact=True rewrites logs.json
+    at the end instead, which loads the whole store into memory.
+    Returns a summary dict with counts of read/imported/duplicate/rejected rows.
+    """
+    fmt = fmt or _detect_format(path)
+    stats = {"read": 0, "imported": 0, "duplicates": 0, "rejected": 0, "chunks": 0}
+    imported_users = set()     #whose personal models may need retraining afterwards
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "seen.sqlite"))
+        try:
+            conn.execute("CREATE TABLE seen (user_id TEXT, ts INTEGER, PRIMARY KEY (user_id, ts)) WITHOUT ROWID")
+            _seed_index(conn, log_path)
+
+            for chunk in _read_chunks(path, fmt, chunk_size):
+                stats["read"] += len(chunk)
+                clean, rejected = _clean_chunk(chunk, default_user_id)
+                stats["rejected"] += rejected
+
+                fresh = []
+                for uid, key in zip(clean["user_id"], clean["ts_key"]):
+                    cur = conn.execute("INSERT OR IGNORE INTO seen VALUES (?, ?)", (uid, int(key)))
+                    fresh.append(cur.rowcount == 1)
+                new_rows = clean[fresh].drop(columns="ts_key")
+
+                # journal first, then the index: after a crash the next run re-seeds from the store
+                if len(new_rows):
+                    append_journal(log_path, new_rows.to_json(orient="records", lines=True, force_ascii=False))
+                conn.commit()
+
+                added = len(new_rows)
+                imported_users.update(new_rows["user_id"].unique())
+                stats["imported"] += added
+                stats["duplicates"] += len(chunk) - rejected - added   #in-chunk and already-stored repeats
+                stats["chunks"] += 1
+                print(f"[bulk_import] chunk {stats['chunks']}: {added} new rows")
+        finally:
+            conn.close()
+
+    if stats["imported"] and (compact or retrain):
+        # open the store as an imported user, so no empty default user gets created
+        profile = UserProfile(user_id=sorted(imported_users)[0], log_path=log_path)
+        if compact:
+            profile.compact()     #one logs.json rewrite for the whole import
+        if retrain:
+            try:
+                retrain_if_needed(profile, user_ids=sorted(imported_users))
+            except Exception as e:
+                print(f"[bulk_import] retrain_if_needed failed: {e}")
+
+    print(f"[bulk_import] Done: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import wearable exports into logs.json")
+    parser.add_argument("path")
+    parser.add_argument("--log-path", default="C:/Users/Sithumi/src/data/logs.json")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--user-id", default="user_1")
+    parser.add_argument("--no-retrain", action="store_true")
+    parser.add_argument("--compact", action="store_true",
+                        help="rewrite logs.json right after the import (memory grows with the store)")
+    args = parser.parse_args()
+    import_file(args.path, log_path=args.log_path, fmt=args.format, chunk_size=args.chunk_size,
+                default_user_id=args.user_id, retrain=not args.no_retrain, compact=args.compact)
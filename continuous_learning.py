@@ -1,62 +1,160 @@
 # continuous_learning.py
 import os    #Used for checking if files exist, reading file paths
-import json   #Used for reading JSON files
-from ml_models import train_fatigue_model_from_logs, MODEL_META , MODEL_PATH
-
-#MODEL META - File path where training information is saved
-#MODEL PATH - where the trained model will be saved
-
-def _read_meta():
-    if os.path.exists(MODEL_META):                   #if metadata file exists, open it
-        try:                                            
-            with open(MODEL_META, "r", encoding="utf-8") as f:
-                return json.load(f)       #try to load json data
-        except:
-            return {}             #if file is broaken or unreadable, return an empty dictionary
-    return {}                     #if file does not exist at all, return
-
-def retrain_if_needed(user_profile, min_records=7, retrain_every=7):
+import numpy as np   #drift / error checks on the new rows
+from instrumentation import timed, inc
+from ml_models import (train_fatigue_model_from_logs, MODEL_PATH, FEATURES, PERSONAL_FEATURES,
+                       PERSONAL_MIN_ROWS, read_model_meta, load_fatigue_model, load_fatigue_model_with_meta,
+                       new_training_rows, update_fatigue_model, save_fatigue_model, user_model_path,
+                       compare_with_global)
+
+#MODEL PATH - where the trained model will be saved; training information goes to MODEL_PATH + ".meta"
+
+#incremental mode settings
+TREES_PER_UPDATE = 10      #trees added per incremental update, fit on the new rows plus recent history
+MAX_TREES = 100            #oldest incremental trees are pruned beyond this; trees of the full fit stay
+MAE_RATIO = 2.0            #error on the new rows above this many times the full fit's error -> full retrain
+MAE_FLOOR = 0.1            #...but never below this, so a near-perfect full fit doesn't retrain on noise
+DRIFT_THRESHOLD = 1.0      #standardized mean shift of any feature above this -> full retrain
+
+def _read_meta(model_path=MODEL_PATH):
+    return read_model_meta(model_path)
+
+def _drift(meta, X_new):
+    # largest standardized mean difference between new rows and the data of the last full retrain
+    base = meta.get("baseline") or {}
+    if not base or len(X_new) < 2:
+        return 0.0
+    mean, std = np.array(base["mean"]), np.array(base["std"])
+    pooled = np.sqrt((std ** 2 + X_new.std(axis=0) ** 2) / 2) + 1e-9
+    return float(np.max(np.abs(X_new.mean(axis=0) - mean) / pooled))
+
+def _full_retrain_reason(meta, mae, X_new):
+    """Return why the model needs a full retrain, or None if an incremental update is fine."""
+    limit = max(MAE_FLOOR, MAE_RATIO * meta.get("base_mae", 0.0))
+    if mae > limit:
+        return f"error on new data {mae:.2f} > {limit:.2f}"
+    drift = _drift(meta, X_new)
+    if drift > DRIFT_THRESHOLD:
+        return f"feature drift {drift:.2f} > {DRIFT_THRESHOLD}"
+    return None
+
+def _incremental_update(log_path, model_path, meta, data=None, global_model=None, global_meta=None):
+    """
+    Try to update the saved model with only the new rows. Returns None if a full retrain is needed.
+    Personal models are first compared with the global model on the new rows (beats_global).
+    """
+    if "user_rows" not in meta or "base_mae" not in meta:
+        return None                    #model predates incremental mode (or came from train.csv)
+    model, features = load_fatigue_model(model_path)
+    expected = FEATURES if meta.get("user_id") is None else PERSONAL_FEATURES
+    if model is None or features != expected:
+        return None
+
+    X_new, y_new, X_fit, y_fit, counts = new_training_rows(log_path, meta["user_rows"], user_id=meta.get("user_id"),
+                                                           data=data)
+    if len(X_new) == 0:
+        return None
+
+    mae = float(np.mean(np.abs(model.predict(X_new) - y_new)))   #how well the current model fits the new rows
+    reason = _full_retrain_reason(meta, mae, X_new)
+    if reason:
+        print(f"[continuous_learning] Full retrain needed: {reason}")
+        return None
+
+    if meta.get("user_id") is not None and data is not None:
+        compare_with_global(model, meta, global_model, global_meta, log_path, data)   #before the new rows are learned
+    update_fatigue_model(model, X_fit, y_fit, trees_per_update=TREES_PER_UPDATE, max_trees=MAX_TREES,
+                         base_trees=meta.get("base_trees", 0))
+    meta.update({
+        "trained_on_rows": meta.get("trained_on_rows", 0) + len(X_new),
+        "user_rows": counts,
+        "mode": "incremental",
+        "updates_since_full": meta.get("updates_since_full", 0) + 1,
+        "last_mae": mae,
+    })
+    save_fatigue_model(model, features, model_path, meta)
+    inc("retrain_total", labels={"mode": "incremental", "scope": "user" if meta.get("user_id") else "global"})
+    print(f"[continuous_learning] Incremental update on {len(X_new)} new records, "
+          f"fit on {len(X_fit)} recent ({len(model.estimators_)} trees)")
+    return model, features
+
+def _retrain_model(log_path, model_path, count, retrain_every, mode, user_id=None, data=None,
+                   global_model=None, global_meta=None):
+    meta = _read_meta(model_path) #reads a small JSON file that stores how many rows were used the last time the model was trained.
+    trained_on = meta.get("trained_on_rows", 0)  #number of rows used previously.If it doesn't exist
+
+    # Conditions to retrain:
+    # count - current num of valid records
+    # trained on - last trained entries count. if first time trained on is 0
+    if trained_on == 0 or (count - trained_on) >= retrain_every:
+        if mode == "incremental" and trained_on > 0:
+            model_info = _incremental_update(log_path, model_path, meta, data=data,
+                                             global_model=global_model, global_meta=global_meta)
+            if model_info:
+                return model_info
+        who = f"user {user_id}" if user_id else "global"
+        print(f"[continuous_learning] Retraining {who} model: {trained_on} -> {count} records")
+        inc("retrain_total", labels={"mode": "full", "scope": "user" if user_id else "global"})
+        return train_fatigue_model_from_logs(log_path=log_path, save_path=model_path, user_id=user_id,
+                                             data=data, global_model=global_model, global_meta=global_meta)
+
+    # no retrain needed
+    return None
+
+@timed("retrain_check")
+def retrain_if_needed(user_profile, min_records=7, retrain_every=7, mode="incremental",
+                      model_path=MODEL_PATH, user_ids=None):
     """
     Check user_profile log and retrain the fatigue model if:
       - model doesn't exist, and there are >= min_records
       - or number of records used increased by retrain_every
     This is intentionally conservative to avoid retraining on every write.
+    mode="incremental" first tries to add trees fit on just the new records and only
+    falls back to a full retrain when drift/error checks say so; mode="full" always refits.
+    The same check also runs for the personal model of each user in user_ids
+    (default: the profile's user) once they have PERSONAL_MIN_ROWS records.
+    The profile's in-memory logs are used throughout, so checking many users
+    (bulk import) doesn't re-read logs.json per user.
+    Returns the global model info if it was retrained.
     """
     log_path = user_profile.log_path
     if not os.path.exists(log_path):
         return None
 
-    try:
-        with open(log_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except Exception:
-        return None
+    data = user_profile.data    #already merged with the bulk-import journal
 
-    # count usable entries
+    # count usable entries, overall and per user
     count = 0             #Start with zero records.
+    per_user = {}
     users = data.get("users", {})
     for uid, ud in users.items():
         for h in ud.get("history", []):
             if all(k in h for k in ("steps", "sleep", "water", "mood")):   #Check if this record contains all four required fields
                 count += 1   #If all exist → this record is valid and we increase the count by 1.
+                per_user[uid] = per_user.get(uid, 0) + 1
 
     if count < min_records:
         # If less than 7 valid logs → model cannot be trained.
         return None
 
-    meta = _read_meta() #reads a small JSON file that stores how many rows were used the last time the model was trained.
-    trained_on = meta.get("trained_on_rows", 0)  #number of rows used previously.If it doesn't exist
+    # personal models are checked before the global retrain, so the records they are compared on
+    # are still unseen by the global model; without a global model yet, that is trained first
+    due = [uid for uid in (user_ids or [user_profile.user_id]) if per_user.get(uid, 0) >= PERSONAL_MIN_ROWS]
+    model_info, global_checked = None, False
+    if not due or not os.path.exists(model_path):
+        model_info = _retrain_model(log_path, model_path, count, retrain_every, mode, data=data)
+        global_checked = True
 
-    # Conditions to retrain:
-    # count - current num of valid records
-    # trained on - last trained entries count. if first time trained on is 0
-    if trained_on == 0 or (count - trained_on) >= retrain_every:
-        print(f"[continuous_learning] Retraining model: {trained_on} -> {count} records")
-        model_info = train_fatigue_model_from_logs(log_path=log_path, save_path=MODEL_PATH)
-        return model_info
+    if due:
+        global_model, _, global_meta = load_fatigue_model_with_meta(model_path)   #loaded once for every user
+        for uid in due:
+            _retrain_model(log_path, user_model_path(uid, model_path), per_user[uid], retrain_every, mode,
+                           user_id=uid, data=data, global_model=global_model, global_meta=global_meta)
 
-    # no retrain needed
-    return None
+    if not global_checked:
+        model_info = _retrain_model(log_path, model_path, count, retrain_every, mode, data=data)
+
+    return model_info
 
 #For a new user, the model will train after the first 7 daily entries.
-#Then it retrains every 7 additional new entries after that.
\ No newline at end of file
+#Then it retrains every 7 additional new entries after that.
@@ -1,5 +1,7 @@
 # evaluate_system.py
+import os
 import time       #To measure how long certain operations take (like LLM response time).
+import tempfile   #test users go into a throwaway logs.json, not the real one
 from rag_retriever import RAGRetriever      #Retrieves information from a knowledge base for user queries.
 from recommender import recommend_goals     #Adjusts user goals based on history (steps, sleep, water)
 from health_agent import HealthCoachAgent   #Main AI agent for proactive health advice.
@@ -51,27 +53,31 @@ def evaluate_goal_adjustment():
         "reasons": reasons
     }
 
+#see benchmark_suite.py for repeatable latency/throughput/memory benchmarks
+
 def evaluate_proactive_agent():
-    user = UserProfile("test_user")
-    agent = HealthCoachAgent(user)
+    with tempfile.TemporaryDirectory() as tmp:     #removed afterwards, with its snapshots
+        user = UserProfile("test_user", log_path=os.path.join(tmp, "logs.json"))
+        agent = HealthCoachAgent(user)
 
-    for i in range(3):
-        user.update_today(steps=3000, sleep=5, water=1.2, mood="Tired")
+        for i in range(3):
+            user.update_today(steps=3000, sleep=5, water=1.2, mood="Tired")
 
-    actions = agent.proactive_actions()
+        actions = agent.proactive_actions()
     return {
         "alerts_triggered": actions
     }
 
 def evaluate_llm_response():
-    user = UserProfile("test_user2")
-    agent = HealthCoachAgent(user)
+    with tempfile.TemporaryDirectory() as tmp:
+        user = UserProfile("test_user2", log_path=os.path.join(tmp, "logs.json"))
+        agent = HealthCoachAgent(user)
 
-    metrics = {"steps": 4000, "sleep": 6, "water": 1.2, "mood": "Okay"}
+        metrics = {"steps": 4000, "sleep": 6, "water": 1.2, "mood": "Okay"}
 
-    start = time.time()
-    result = agent.generate_advice(metrics)
-    end = time.time()
+        start = time.time()
+        result = agent.generate_advice(metrics)
+        end = time.time()
 
     return {
         "llm_response_time": end - start,
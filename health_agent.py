@@ -8,11 +8,15 @@ try:
 except Exception:
     GPT4All = None
 
-from ml_models import load_fatigue_model, heuristic_fatigue_score
+from ml_models import heuristic_fatigue_score, fatigue_feature_vector, BASELINE_WINDOW, MODEL_PATH
+from model_cache import get_fatigue_model
+from instrumentation import timed, profiled, inc
 
 class HealthCoachAgent:
-    def __init__(self, user_profile, rag=None, llm_path="C:/Users/Sithumi/src/model/gpt4all/Phi-3-mini-4k-instruct.Q4_0.gguf"):
+    def __init__(self, user_profile, rag=None, llm_path="C:/Users/Sithumi/src/model/gpt4all/Phi-3-mini-4k-instruct.Q4_0.gguf",
+                 model_path=MODEL_PATH):
         self.user = user_profile      #This saves the user profile inside the agent
+        self.model_path = model_path  #global fatigue model; personal ones live next to it
         self.rag = rag or RAGRetriever()      #search from the users
         self.llm = None
         if llm_path and GPT4All and os.path.exists(llm_path):  #check three conditions and then load if all ok
@@ -21,20 +25,29 @@ class HealthCoachAgent:
             except Exception:       #If anything goes wrong
                 self.llm = None     #system uses fallback explanations instead of LLM text
 
-        # Load the fatigue model 
-        self.fatigue_model, self.fatigue_features = load_fatigue_model()
+        # Fatigue models are looked up per request through the shared LRU cache,
+        # so a retrain (global or personal) is picked up without recreating the agent
 
+    @timed("llm_query")
     def _query_llm(self, prompt, max_tokens=250):     #max length of the response
         if self.llm:
             try:
                 resp = self.llm.generate(prompt, max_tokens=max_tokens)
                 return resp.strip()   #remove extra spaces from the start/end of the response
             except Exception:         #if llm fails, do nothing
-                pass
+                inc("llm_errors_total")
         return None
 
-    def generate_advice(self, metrics):
-        """High-level method to generate explainable advice."""
+    @timed("generate_advice")
+    def generate_advice(self, metrics, profile=False, profile_kind=None):
+        """
+        High-level method to generate explainable advice. profile=True profiles this call,
+        profile_kind="cprofile" or "sampling" picks the profiler (see instrumentation.profiled).
+        """
+        with profiled("generate_advice", enabled=profile, kind=profile_kind):
+            return self._generate_advice(metrics)
+
+    def _generate_advice(self, metrics):
         query = f"best practices for steps {metrics['steps']}, sleep {metrics['sleep']}, water {metrics['water']}"
         resources = self.rag.retrieve(query, top_k=3)   #gets the best 3 documents that match the query.
 
@@ -44,20 +57,23 @@ class HealthCoachAgent:
 
         latest = metrics      #store incoming user data
         fatigue_score = None
-        if self.fatigue_model:
+        fatigue_model, features, _ = get_fatigue_model(self.user.user_id, base_path=self.model_path)   #personal model if it beats the global one
+        if fatigue_model:
             try:
-                # create feature vector in the same order as training
-                mood_enc = 0    #default value for the encoded mood.
-                if "mood" in latest:
-                    mood = latest.get("mood", "Neutral")
-                    mapping = {"happy":0,"okay":1,"neutral":1,"tired":2,"stressed":3,"sad":3}  #Convert mood text → number
-                    mood_enc = mapping.get(str(mood).lower(), 1)
-                X = [[latest.get("steps",0), latest.get("sleep",0), latest.get("water",0), mood_enc]]
-                fatigue_score = float(self.fatigue_model.predict(X)[0])   #float-converts the value to a normal number, 0-pick the first prediction from the list
+                # create feature vector in the same order as training; personal models also
+                # compare today's values with the user's previous records
+                recent = self.user.get_history()[-(BASELINE_WINDOW + 1):]
+                if recent and recent[-1] == latest:
+                    recent = recent[:-1]       #the entry being scored was just saved
+                X = fatigue_feature_vector(latest, features, recent=recent)
+                fatigue_score = float(fatigue_model.predict(X)[0])   #float-converts the value to a normal number, 0-pick the first prediction from the list
+                inc("fatigue_scores_total", labels={"source": "model"})
             except Exception:
                 fatigue_score = heuristic_fatigue_score(latest)
+                inc("fatigue_scores_total", labels={"source": "heuristic"})
         else:
             fatigue_score = heuristic_fatigue_score(latest)
+            inc("fatigue_scores_total", labels={"source": "heuristic"})
 
         bullets = []
         if metrics["steps"] < new_goals["steps"]:
@@ -102,6 +118,7 @@ class HealthCoachAgent:
         if llm_text:
             final = llm_text
         else:
+            inc("llm_fallback_total")     #template advice used instead of LLM text
             final = "\n\n".join(["- " + b for b in bullets]) + "\n\nReasons:\n" + "\n".join(["- " + e for e in explanations])
 
         return {
@@ -0,0 +1,343 @@
+# history_store.py
+import os
+import re
+import json
+import shutil
+import time
+import hashlib
+import datetime
+import numpy as np     #typed columns + memory mapping
+import pandas as pd    #building DataFrames straight from the columns
+
+#Columnar snapshot of a user's history, kept next to logs.json:
+#   <logs.json>.snapshots/<user_id>/timestamp.bin, steps.bin, ... + meta.json
+#Each column is a raw little-endian array that is only ever appended to, so
+#readers can np.memmap it and slice without copying. logs.json stays the
+#source of truth; meta.json records how many of its rows the snapshot covers
+#plus a hash of those rows, so any edit to them (even one that keeps the
+#length) triggers a rebuild.
+#
+#Bulk imports don't rewrite logs.json per chunk; they append to a journal
+#(<logs.json>.journal, one JSON entry with its user_id per line). A UserProfile
+#first renames the journal aside to a sealed segment (<logs.json>.journal.<id>),
+#merges every sealed segment on load and, when it next saves logs.json, records
+#the segment names in it and deletes exactly those segments. Rows appended by an
+#import after the profile loaded go to a new journal and are never touched.
+
+COLUMNS = {
+    "timestamp": np.dtype("<M8[us]"),   #NaT when missing/unparseable
+    "steps": np.dtype("<f8"),           #float so missing values can be NaN
+    "sleep": np.dtype("<f8"),
+    "water": np.dtype("<f8"),
+    "mood": np.dtype("i1"),             #index into MOOD_LABELS, -1 when missing
+}
+
+MOOD_LABELS = ["Neutral", "Happy", "Okay", "Sad", "Stressed", "Tired"]
+_MOOD_CODES = {m.lower(): i for i, m in enumerate(MOOD_LABELS)}
+
+
+def safe_user_id(user_id):
+    # user id -> something safe to use as a file/directory name; the hash keeps
+    # ids that sanitize to the same text (e.g. "a b" and "a_b") apart
+    digest = hashlib.sha1(str(user_id).encode("utf-8")).hexdigest()[:8]
+    return (re.sub(r"[^A-Za-z0-9_.-]", "_", str(user_id)) or "_") + "-" + digest
+
+
+def _parse_ts(value):
+    try:
+        dt = datetime.datetime.fromisoformat(str(value))
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)   #stored times are naive UTC
+        return np.datetime64(dt, "us")
+    except Exception:
+        return np.datetime64("NaT", "us")
+
+
+def timestamp_us(value):
+    """Stored timestamp string -> integer microseconds (the dedupe key bulk_import uses), or None."""
+    ts = _parse_ts(value)
+    return None if np.isnat(ts) else int(ts.astype(np.int64))
+
+
+def _num(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _encode_rows(entries):
+    """Turn a list of history dicts into one typed array per column."""
+    n = len(entries)
+    cols = {name: np.empty(n, dtype=dt) for name, dt in COLUMNS.items()}
+    for i, h in enumerate(entries):
+        cols["timestamp"][i] = _parse_ts(h.get("timestamp"))
+        cols["steps"][i] = _num(h.get("steps"))
+        cols["sleep"][i] = _num(h.get("sleep"))
+        cols["water"][i] = _num(h.get("water"))
+        mood = h.get("mood")
+        cols["mood"][i] = -1 if mood is None else _MOOD_CODES.get(str(mood).lower(), 0)
+    return cols
+
+
+def _fingerprint(history, rows):
+    # hash of every covered row; one json.dumps of the list, ~2ms per 1000 rows
+    if rows <= 0:
+        return ""
+    return hashlib.sha1(json.dumps(history[:rows], default=str).encode("utf-8")).hexdigest()
+
+
+def snapshots_root(log_path):
+    # keyed on the log file, so two stores in one directory don't share (or prune) snapshots
+    return log_path + ".snapshots"
+
+
+def _remove_legacy_snapshots(log_path):
+    # older versions kept snapshots in <log dir>/snapshots/, shared by every store in the directory
+    legacy = os.path.join(os.path.dirname(log_path) or ".", "snapshots")
+    if not os.path.isdir(legacy):
+        return
+    entries = [os.path.join(legacy, n) for n in os.listdir(legacy)]
+    if all(os.path.exists(os.path.join(e, "meta.json")) for e in entries):   #only ever our own snapshot folders
+        shutil.rmtree(legacy, ignore_errors=True)
+
+
+def prune_snapshots(log_path, user_ids):
+    """Delete snapshot directories of users that are no longer in logs.json."""
+    _remove_legacy_snapshots(log_path)
+    root = snapshots_root(log_path)
+    if not os.path.isdir(root):
+        return []
+    keep = {safe_user_id(u) for u in user_ids}
+    removed = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name not in keep and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(name)
+    return removed
+
+
+class HistorySnapshot:
+    def __init__(self, log_path, user_id):
+        self.user_id = user_id
+        self.dir = os.path.join(snapshots_root(log_path), safe_user_id(user_id))
+        self.meta_path = os.path.join(self.dir, "meta.json")
+
+    def _col_path(self, name):
+        return os.path.join(self.dir, name + ".bin")
+
+    def _read_meta(self):
+        if not os.path.exists(self.meta_path):
+            return {}
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def __len__(self):
+        return int(self._read_meta().get("rows", 0))
+
+    def _write_meta(self, rows, fingerprint=""):
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"rows": rows, "fingerprint": fingerprint, "columns": {k: v.str for k, v in COLUMNS.items()}}, f)
+        os.replace(tmp, self.meta_path)    #meta is only updated once the column bytes are on disk
+
+    def append(self, entries, fingerprint=""):
+        """Append history dicts to every column file. fingerprint describes the history after the append."""
+        if not entries:
+            return len(self)
+        os.makedirs(self.dir, exist_ok=True)
+        rows = len(self)
+        cols = _encode_rows(entries)
+        for name, dt in COLUMNS.items():
+            path = self._col_path(name)
+            with open(path, "ab") as f:
+                # drop bytes from an append that crashed before meta.json was written
+                if os.path.getsize(path) != rows * dt.itemsize:
+                    f.truncate(rows * dt.itemsize)
+                f.write(cols[name].tobytes())
+        self._write_meta(rows + len(entries), fingerprint)
+        return rows + len(entries)
+
+    def rebuild(self, history):
+        """Rewrite the snapshot from scratch (used when it no longer matches logs.json)."""
+        os.makedirs(self.dir, exist_ok=True)
+        self._write_meta(0)
+        for name in COLUMNS:
+            with open(self._col_path(name), "wb"):
+                pass
+        return self.append(history, _fingerprint(history, len(history)))
+
+    def sync(self, history):
+        """
+        Bring the snapshot in line with a history list from logs.json.
+        History is append-only, so normally only the missing tail is encoded;
+        covered rows that no longer hash the same mean logs.json was edited -> rebuild.
+        """
+        meta = self._read_meta()
+        rows = int(meta.get("rows", 0))
+        if rows > len(history) or meta.get("fingerprint", "") != _fingerprint(history, rows):
+            return self.rebuild(history)
+        if rows == len(history):
+            return rows
+        return self.append(history[rows:], _fingerprint(history, len(history)))
+
+    def columns(self):
+        """Read-only memmaps of every column (zero-copy; slice them freely)."""
+        rows = len(self)
+        out = {}
+        for name, dt in COLUMNS.items():
+            if rows == 0:
+                out[name] = np.empty(0, dtype=dt)
+            else:
+                out[name] = np.memmap(self._col_path(name), dtype=dt, mode="r", shape=(rows,))
+        return out
+
+    def frame(self, days=None):
+        """DataFrame built directly from the column arrays, optionally only the last `days` days."""
+        cols = self.columns()
+        if days:
+            cutoff = np.datetime64(datetime.datetime.utcnow() - datetime.timedelta(days=days), "us")
+            keep = cols["timestamp"] >= cutoff
+            cols = {k: v[keep] for k, v in cols.items()}
+        mood = np.asarray(cols["mood"])
+        labels = np.array(MOOD_LABELS + [None], dtype=object)
+        return pd.DataFrame({
+            "timestamp": cols["timestamp"],
+            "steps": cols["steps"],
+            "sleep": cols["sleep"],
+            "water": cols["water"],
+            "mood": labels[mood],           #code -1 picks the trailing None
+        }, copy=False)
+
+
+# --------------------------- import journal ---------------------------
+
+def journal_path(log_path):
+    return log_path + ".journal"
+
+
+def append_journal(log_path, lines):
+    """Append already-serialized JSON lines (one entry each, with user_id)."""
+    if not lines:
+        return
+    if not lines.endswith("\n"):
+        lines += "\n"
+    with open(journal_path(log_path), "a", encoding="utf-8") as f:
+        f.write(lines)
+
+
+JOURNAL_DONE_KEY = "compacted_journals"    #logs.json key: sealed segments already folded into it
+
+
+def _segment_prefix(log_path):
+    return os.path.basename(journal_path(log_path)) + "."
+
+
+def journal_segments(log_path):
+    """Names of sealed journal segments, oldest first."""
+    folder = os.path.dirname(log_path) or "."
+    prefix = _segment_prefix(log_path)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(n for n in os.listdir(folder) if n.startswith(prefix) and not n.endswith(".tmp"))
+
+
+def _new_segment_path(log_path):
+    # zero-padded time first so names sort in sealing order
+    return f"{journal_path(log_path)}.{time.time_ns():020d}-{os.getpid()}"
+
+
+def seal_journal(log_path):
+    """Rename the active journal aside so later imports start a new one."""
+    path = journal_path(log_path)
+    if not os.path.exists(path):
+        return None
+    target = _new_segment_path(log_path)
+    try:
+        os.replace(path, target)
+    except OSError as e:
+        # e.g. Windows while an import has it open; its rows are picked up on the next load
+        print(f"[history_store] could not seal journal {path}: {e}")
+        return None
+    return os.path.basename(target)
+
+
+def _merge_file(data, path):
+    # returns the byte offset read; a partial last line from a writer still appending is left
+    with open(path, "rb") as f:
+        raw = f.read()
+    end = raw.rfind(b"\n") + 1
+    users = data.setdefault("users", {})
+    for line in raw[:end].decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        uid = entry.pop("user_id")
+        users.setdefault(uid, {"history": [], "goals": {}})["history"].append(entry)
+    return end
+
+
+def merge_journal(data, log_path, seal=False):
+    """
+    Add journal entries to data["users"][uid]["history"].
+    Segments listed under JOURNAL_DONE_KEY in data are already in logs.json and are skipped.
+    seal=False (read-only callers): sealed segments and the active journal are merged.
+    seal=True (callers that will save logs.json): the active journal is sealed first and only
+    sealed segments are merged. Returns [(segment name, bytes merged)] for release_journal.
+    """
+    if seal:
+        seal_journal(log_path)
+    folder = os.path.dirname(log_path) or "."
+    done = set(data.get(JOURNAL_DONE_KEY, []))
+    merged = []
+    for name in journal_segments(log_path):
+        if name in done:
+            continue                  #compacted, but its deletion was interrupted
+        merged.append((name, _merge_file(data, os.path.join(folder, name))))
+    if not seal and os.path.exists(journal_path(log_path)):
+        _merge_file(data, journal_path(log_path))
+    return merged
+
+
+def release_journal(log_path, merged):
+    """
+    Delete sealed segments whose rows are now in logs.json. Bytes appended to a segment
+    after it was read (a write racing the rename) are kept in a new segment.
+    """
+    folder = os.path.dirname(log_path) or "."
+    for name, end in merged:
+        path = os.path.join(folder, name)
+        if not os.path.exists(path):
+            continue                  #another profile already compacted it
+        if os.path.getsize(path) > end:
+            with open(path, "rb") as f:
+                f.seek(end)
+                rest = f.read()
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(rest)
+            os.replace(tmp, _new_segment_path(log_path))
+        os.remove(path)
+
+
+def clear_compacted(data, log_path):
+    """Remove leftover segments that logs.json (data) says it already contains."""
+    folder = os.path.dirname(log_path) or "."
+    for name in data.get(JOURNAL_DONE_KEY, []):
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def load_logs(log_path):
+    """logs.json plus any journal entries not yet compacted into it."""
+    data = {"users": {}}
+    if os.path.exists(log_path):
+        with open(log_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    merge_journal(data, log_path)
+    return data
@@ -0,0 +1,212 @@
+# instrumentation.py
+import os
+import io
+import json
+import time
+import pstats
+import cProfile
+import threading
+import contextlib
+import functools
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler   #optional sampling profiler
+except Exception:
+    SamplingProfiler = None
+
+#Lightweight timings/counters for the hot paths (advice, retrieval, LLM, saves,
+#retraining). Off by default: every hook checks one module flag and returns,
+#so the cost when disabled is a function call and an if. Turn on with
+#HEALTH_COACH_METRICS=1 or enable().
+
+PREFIX = "health_coach_"
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)   #seconds
+
+_enabled = os.environ.get("HEALTH_COACH_METRICS", "") not in ("", "0")
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+def is_enabled():
+    return _enabled
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}      #(name, labels) -> value
+        self.histograms = {}    #(name, labels) -> {"buckets": [...], "sum": s, "count": n}
+        self.profiles = {}      #name -> text report of the last profiled call
+
+    def inc(self, name, value=1, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    h["buckets"][i] += 1      #stored per bucket, made cumulative on export
+                    break
+            h["sum"] += value
+            h["count"] += 1
+
+    def set_profile(self, name, report):
+        with self._lock:
+            self.profiles[name] = report
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.profiles.clear()
+
+    def to_json(self):
+        with self._lock:
+            return {
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self.counters.items()],
+                "histograms": [
+                    {"name": n, "labels": dict(l), "count": h["count"], "sum": h["sum"],
+                     "buckets": dict(zip([str(b) for b in BUCKETS], h["buckets"]))}
+                    for (n, l), h in self.histograms.items()
+                ],
+            }
+
+    def to_prometheus(self):
+        def escape(value):
+            # exposition format: backslash, double quote and newline are escaped in label values
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        def fmt_labels(labels, extra=None):
+            items = list(labels) + (extra or [])
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in items) + "}"
+
+        lines = []
+        with self._lock:
+            for name in sorted({n for n, _ in self.counters}):
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                for (n, l), v in self.counters.items():
+                    if n == name:
+                        lines.append(f"{PREFIX}{name}{fmt_labels(l)} {v}")
+            for name in sorted({n for n, _ in self.histograms}):
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for (n, l), h in self.histograms.items():
+                    if n != name:
+                        continue
+                    running = 0
+                    for bound, c in zip(BUCKETS, h["buckets"]):
+                        running += c
+                        lines.append(f"{PREFIX}{name}_bucket{fmt_labels(l, [('le', bound)])} {running}")
+                    lines.append(f"{PREFIX}{name}_bucket{fmt_labels(l, [('le', '+Inf')])} {h['count']}")
+                    lines.append(f"{PREFIX}{name}_sum{fmt_labels(l)} {h['sum']}")
+                    lines.append(f"{PREFIX}{name}_count{fmt_labels(l)} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def inc(name, value=1, labels=None):
+    if _enabled:
+        REGISTRY.inc(name, value, labels)
+
+def observe(name, value, labels=None):
+    if _enabled:
+        REGISTRY.observe(name, value, labels)
+
+
+class _Span:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name, self.labels = name, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        REGISTRY.observe(self.name + "_seconds", time.perf_counter() - self.start, self.labels)
+        if exc_type is not None:
+            REGISTRY.inc(self.name + "_errors_total", 1, self.labels)
+        return False
+
+_NOOP = contextlib.nullcontext()
+
+def span(name, labels=None):
+    """with span("retrieve"): ... -> records <name>_seconds (and <name>_errors_total on exceptions)."""
+    return _Span(name, labels) if _enabled else _NOOP
+
+def timed(name, labels=None):
+    """Decorator version of span()."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name, labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+@contextlib.contextmanager
+def profiled(name, enabled=False, kind=None, top=25):
+    """
+    Profile one request when enabled=True (or HEALTH_COACH_PROFILE=1).
+    kind="cprofile" (stdlib) or "sampling" (needs pyinstrument); default is
+    $HEALTH_COACH_PROFILE_KIND, else "cprofile". The text report is kept in
+    REGISTRY.profiles[name], and also written to $HEALTH_COACH_PROFILE_DIR if set.
+    """
+    enabled = enabled or os.environ.get("HEALTH_COACH_PROFILE", "") not in ("", "0")
+    if not enabled:
+        yield
+        return
+
+    kind = kind or os.environ.get("HEALTH_COACH_PROFILE_KIND", "cprofile")
+    if kind == "sampling" and SamplingProfiler is None:
+        print("[instrumentation] pyinstrument not installed; using cProfile")
+
+    if kind == "sampling" and SamplingProfiler is not None:
+        prof = SamplingProfiler()
+        prof.start()
+        try:
+            yield
+        finally:
+            prof.stop()
+            report = prof.output_text()
+    else:
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            out = io.StringIO()
+            pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(top)
+            report = out.getvalue()
+
+    REGISTRY.set_profile(name, report)
+    out_dir = os.environ.get("HEALTH_COACH_PROFILE_DIR")
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, f"{name}_{int(time.time() * 1000)}.txt"), "w", encoding="utf-8") as f:
+            f.write(report)
+
+
+def dump(fmt="prometheus", path=None):
+    """Current metrics as Prometheus text or JSON; written to path if given."""
+    text = REGISTRY.to_prometheus() if fmt == "prometheus" else json.dumps(REGISTRY.to_json(), indent=2)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    return text
@@ -2,11 +2,21 @@
 import os
 import pickle   #saving ml models
 import json     #reading/writing json files
+import warnings
+import threading   #temp file names for concurrent saves
 from sklearn.ensemble import RandomForestRegressor #ML model to predict fatigue score
 import numpy as np   #convert data into arrays for ml training
+from history_store import HistorySnapshot, MOOD_LABELS, safe_user_id, load_logs   #columnar per-user history
+from instrumentation import timed
 
 MODEL_PATH = "C:/Users/Sithumi/src/data/models/fatigue_model.pkl"
-MODEL_META = MODEL_PATH + ".meta"          #how many rows the model was trained on
+FEATURES = ["steps", "sleep", "water", "mood_encoded"]
+#personal models also see how far each value is from the user's own recent average
+PERSONAL_FEATURES = FEATURES + ["steps_vs_avg", "sleep_vs_avg", "water_vs_avg"]
+BASELINE_WINDOW = 7        #previous records averaged for the *_vs_avg features
+PERSONAL_MIN_ROWS = 30     #below this many records a user is served by the global model
+HOLDOUT_FRACTION = 0.2     #latest share of a user's records used to compare personal vs global
+WINDOW_MIN_ROWS = 100      #incremental trees are fit on the new rows plus recent older rows up to this many
   
 #predict fatigue score - using user data(if there are min 7 entries) or else using a dataset
 
@@ -36,63 +46,310 @@ def _encode_mood(mood):
     }
     return mapping.get(mood, 1)    #If the mood is not in the dictionary, it returns 1 (neutral/okay)
 
-#train using user data
-def train_fatigue_model_from_logs(log_path="C:/Users/Sithumi/src/data/logs.json", save_path=MODEL_PATH):
+#_encode_mood / low-mood flag looked up by snapshot mood code
+_MOOD_CODE_ENCODING = np.array([_encode_mood(m) for m in MOOD_LABELS], dtype=np.float64)
+_MOOD_CODE_LOW = np.array([m.lower() in ["sad", "stressed", "tired"] for m in MOOD_LABELS])
+
+def _heuristic_fatigue_scores(steps, sleep, water, low_mood):
+    # array version of heuristic_fatigue_score, same rules
+    score = np.full(len(steps), 5.0)
+    score += np.where(sleep < 6, 2.0, np.where(sleep >= 8, -1.0, 0.0))
+    score += np.where(water < 1.5, 1.0, 0.0)
+    score += np.where(steps < 3000, 0.5, 0.0)
+    score += np.where(low_mood, 1.5, 0.0)
+    return np.clip(score, 0, 10)
+
+def _trailing_mean(values, window=BASELINE_WINDOW):
+    # mean of the previous `window` values, the row itself excluded; the first row uses its own value
+    csum = np.concatenate([[0.0], np.cumsum(values)])
+    i = np.arange(len(values))
+    lo = np.maximum(i - window, 0)
+    n = i - lo
+    return np.where(n > 0, (csum[i] - csum[lo]) / np.maximum(n, 1), values)
+
+def _rows_from_columns(cols, start=0, stop=None, personal=False):
+    """
+    X, y, timestamps and snapshot row numbers for rows start:stop that have steps, sleep,
+    water and mood. personal=True adds the *_vs_avg columns, computed over the whole
+    history so the first rows of the slice still see the records before it.
+    """
+    offset = 0
+    if not personal:
+        cols, offset = {k: v[start:stop] for k, v in cols.items()}, start
+    ok = ~(np.isnan(cols["steps"]) | np.isnan(cols["sleep"]) | np.isnan(cols["water"])) & (cols["mood"] >= 0)
+    steps, sleep, water, mood = cols["steps"][ok], cols["sleep"][ok], cols["water"][ok], cols["mood"][ok]
+    X = np.column_stack([steps, sleep, water, _MOOD_CODE_ENCODING[mood]])
+    y = _heuristic_fatigue_scores(steps, sleep, water, _MOOD_CODE_LOW[mood])
+    ts, idx = cols["timestamp"][ok], np.flatnonzero(ok) + offset
+    if personal:
+        X = np.column_stack([X] + [v - _trailing_mean(v) for v in (steps, sleep, water)])
+        sel = (idx >= start) & (idx < (len(ok) if stop is None else stop))
+        X, y, ts, idx = X[sel], y[sel], ts[sel], idx[sel]
+    return X, y, ts, idx
+
+def _stack(parts, width=len(FEATURES)):
+    if not parts:
+        return np.empty((0, width)), np.empty(0), np.empty(0, dtype="<M8[us]"), np.empty(0, dtype=np.int64)
+    return tuple(np.concatenate(p) for p in zip(*parts))
+
+def _training_arrays_from_logs(data, log_path, since=None, personal=False):
+    """
+    Build X, y for every user from their columnar snapshots (no per-row dicts).
+    since - {user_id: rows already used}; only rows after that offset are returned.
+    personal - use PERSONAL_FEATURES instead of FEATURES.
+    Also returns {user_id: snapshot rows} so callers can remember where they stopped, and
+    [(user_id, snapshot row numbers)] describing which user each block of X came from.
+    """
+    parts, counts, owners = [], {}, []
+    for uid, ud in data.get("users", {}).items():
+        snap = HistorySnapshot(log_path, uid)
+        counts[uid] = snap.sync(ud.get("history", []))
+        parts.append(_rows_from_columns(snap.columns(), (since or {}).get(uid, 0), personal=personal))
+        owners.append((uid, parts[-1][3]))
+    X, y, _, _ = _stack(parts, len(PERSONAL_FEATURES) if personal else len(FEATURES))
+    return X, y, counts, owners
+
+def fatigue_feature_vector(entry, features, recent=()):
+    """
+    One-row feature matrix for a log entry, in the order the model was trained with.
+    recent - the user's entries before this one; used for the *_vs_avg features of personal models.
+    """
+    row = [entry.get("steps", 0), entry.get("sleep", 0), entry.get("water", 0),
+           _encode_mood(entry["mood"]) if "mood" in entry else 0]
+    if len(features) > len(FEATURES):
+        usable = [h for h in recent if all(k in h for k in ("steps", "sleep", "water", "mood"))][-BASELINE_WINDOW:]
+        for i, key in enumerate(("steps", "sleep", "water")):
+            avg = sum(float(h[key]) for h in usable) / len(usable) if usable else row[i]
+            row.append(row[i] - avg)
+    return [row]
+
+def _read_logs(log_path):
     if not os.path.exists(log_path):
         print(f"[ml_models] No logs found at {log_path}; skipping training.")
         return None
-
     try:
-        with open(log_path, "r", encoding="utf-8") as f:   #r-reading mode/utf-read all characters
-            data = json.load(f)
+        return load_logs(log_path)     #logs.json plus rows still in the bulk-import journal
     except Exception as e:
         print(f"[ml_models] Error reading logs {log_path}: {e}") #if anything wrong,print error e
         return None
 
-    # gather records of user
-    rows = []
+def user_model_path(user_id, base_path=MODEL_PATH):
+    #personal models live next to the global one: models/users/<user_id>.pkl
+    return os.path.join(os.path.dirname(base_path) or ".", "users", safe_user_id(user_id) + ".pkl")
+
+def _only_user(data, user_id):
+    # restrict logs to one user (personal model) or keep everyone (global model)
+    if user_id is None:
+        return data
     users = data.get("users", {})
-    for uid, ud in users.items():
-        for h in ud.get("history", []):
-            # ensure required fields exist
-            if all(k in h for k in ("steps", "sleep", "water", "mood")):
-                rows.append({
-                    "steps": float(h["steps"]),
-                    "sleep": float(h["sleep"]),
-                    "water": float(h["water"]),
-                    "mood": h.get("mood", "Neutral")
-                })
-
-    if len(rows) < 7:
-        # too few records for meaningful model
-        print(f"[ml_models] Not enough records to train (need >=7, found {len(rows)})")
-        return None
+    return {"users": {user_id: users[user_id]} if user_id in users else {}}
 
-    X = []
-    y = []
-    for r in rows:
-        X.append([r["steps"], r["sleep"], r["water"], _encode_mood(r["mood"])])
-        y.append(heuristic_fatigue_score(r))
+def read_model_meta(path=MODEL_PATH):
+    meta_path = path + ".meta"
+    if os.path.exists(meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}          #broken meta behaves like no meta -> full retrain
+    return {}
 
-    X = np.array(X)
-    y = np.array(y)
+def _replace_file(path, write, mode):
+    # write to a temp file and swap it in, so readers see the old or the new file, never half of one
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+        write(f)
+    os.replace(tmp, path)
 
+def save_fatigue_model(model, features, save_path=MODEL_PATH, meta=None):
+    os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+    if meta is not None:
+        _replace_file(save_path + ".meta", lambda f: json.dump(meta, f), "w")
+    # meta also goes inside the pickle, so a loaded model is never paired with another fit's meta
+    _replace_file(save_path, lambda f: pickle.dump((model, features, meta or {}), f), "wb")   #wb-write in binary
+
+def _fit_forest(X, y):
     #randomforest-learn patterns even from small dataset, use many small desicion trees,good at learning non linear patterns
-    model = RandomForestRegressor(n_estimators=50, random_state=42) 
-    model.fit(X, y)
+    #oob_score: each row is scored by the trees that didn't see it -> error estimate without a holdout
+    model = RandomForestRegressor(n_estimators=50, random_state=42, oob_score=True)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")     #small data: a few rows may have no out-of-bag trees
+        model.fit(X, y)
+    return model, float(np.nanmean(np.abs(model.oob_prediction_ - y)))
 
-    # save model + feature names
-    os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
-    with open(save_path, "wb") as f:      #wb-write in binary
-        pickle.dump((model, ["steps", "sleep", "water", "mood_encoded"]), f)
+def _holdout_rows(n):
+    return max(1, int(n * HOLDOUT_FRACTION))
 
-    # save the number of rows used to train
-    meta = {"trained_on_rows": len(rows)}
-    with open(MODEL_META, "w", encoding="utf-8") as f:
-        json.dump(meta, f)
+def _user_holdout_oob(model, y, owners):
+    """
+    Out-of-bag error of a global fit on each user's latest records: every row is scored
+    only by trees that didn't train on it, so personal models can be compared against it.
+    """
+    err = np.abs(model.oob_prediction_ - y)
+    out, pos = {}, 0
+    for uid, idx in owners:
+        n = len(idx)
+        seg = err[pos + n - _holdout_rows(n):pos + n] if n >= PERSONAL_MIN_ROWS else np.empty(0)
+        if np.isfinite(seg).any():
+            out[uid] = float(np.nanmean(seg))
+        pos += n
+    return out
 
-    print(f"[ml_models] Trained fatigue model on {len(rows)} records -> saved to {save_path}")
-    return model, ["steps", "sleep", "water", "mood_encoded"]
+def _global_errors(global_model, X, y):
+    try:
+        return np.abs(global_model.predict(X[:, :len(FEATURES)]) - y)
+    except Exception as e:
+        print(f"[ml_models] Could not score global model: {e}")
+        return None
+
+def _holdout_check(X, y, idx, user_id, global_model, global_meta):
+    """
+    Fit a personal model on all but the user's latest records and compare it with the
+    global model on records neither model trained on: the global fit's out-of-bag error on
+    those records, or else the global model's error on holdout records it hasn't seen yet
+    (snapshot rows past its meta "user_rows"). No fair comparison -> keep the global model.
+    """
+    global_meta = global_meta or {}
+    split = len(X) - _holdout_rows(len(X))
+    personal, _ = _fit_forest(X[:split], y[:split])
+    p_err = np.abs(personal.predict(X[split:]) - y[split:])
+    result = {"holdout_rows": len(p_err), "holdout_mae": float(p_err.mean()), "global_holdout_mae": None}
+    if global_model is None:
+        result["beats_global"] = True            #nothing to compare with, better than the heuristic
+        return result
+    oob = global_meta.get("user_holdout_mae", {}).get(user_id)
+    if oob is not None:
+        result["global_holdout_mae"] = oob
+    else:
+        unseen = idx[split:] >= global_meta.get("user_rows", {}).get(user_id, 0)
+        g_err = _global_errors(global_model, X[split:][unseen], y[split:][unseen]) if unseen.any() else None
+        if g_err is not None:
+            result.update(holdout_rows=int(unseen.sum()), holdout_mae=float(p_err[unseen].mean()),
+                          global_holdout_mae=float(g_err.mean()))
+    result["beats_global"] = (result["global_holdout_mae"] is not None
+                              and result["holdout_mae"] < result["global_holdout_mae"])
+    return result
+
+def compare_with_global(model, meta, global_model, global_meta, log_path, data):
+    """
+    Before an incremental update: score a personal model and the global model on the
+    user's records that neither has trained on yet, and fold the result into the running
+    holdout comparison in meta (beats_global is re-decided). Returns meta.
+    """
+    user_id = meta.get("user_id")
+    if global_model is None or user_id not in data.get("users", {}):
+        return meta
+    snap = HistorySnapshot(log_path, user_id)
+    snap.sync(data["users"][user_id].get("history", []))
+    since = max(meta.get("user_rows", {}).get(user_id, 0), (global_meta or {}).get("user_rows", {}).get(user_id, 0))
+    X, y, _, _ = _rows_from_columns(snap.columns(), since, personal=True)
+    g_err = _global_errors(global_model, X, y) if len(X) else None
+    if g_err is None:
+        return meta
+    p_err = np.abs(model.predict(X) - y)
+    n_old = meta.get("holdout_rows", 0) if meta.get("global_holdout_mae") is not None else 0
+    n = n_old + len(X)
+    meta["holdout_mae"] = (meta.get("holdout_mae", 0.0) * n_old + p_err.sum()) / n
+    meta["global_holdout_mae"] = ((meta.get("global_holdout_mae") or 0.0) * n_old + g_err.sum()) / n
+    meta["holdout_rows"] = n
+    meta["beats_global"] = bool(meta["holdout_mae"] < meta["global_holdout_mae"])
+    return meta
+
+#train using user data
+@timed("train_fatigue_model")
+def train_fatigue_model_from_logs(log_path="C:/Users/Sithumi/src/data/logs.json", save_path=MODEL_PATH, user_id=None,
+                                  data=None, global_model=None, global_meta=None):
+    """
+    Train on every user's logs, or only on user_id's logs for a personal model.
+    data - already loaded logs (skips re-reading log_path).
+    global_model, global_meta - compared against a personal model on the user's latest
+    records; the personal model is only served when it does better (meta "beats_global").
+    """
+    if data is None:
+        data = _read_logs(log_path)
+    if data is None:
+        return None
+
+    # gather records from the columnar snapshots
+    personal = user_id is not None
+    X, y, counts, owners = _training_arrays_from_logs(_only_user(data, user_id), log_path, personal=personal)
+
+    min_rows = 7 if user_id is None else PERSONAL_MIN_ROWS
+    if len(X) < min_rows:
+        # too few records for meaningful model
+        print(f"[ml_models] Not enough records to train (need >={min_rows}, found {len(X)})")
+        return None
+
+    model, base_mae = _fit_forest(X, y)
+
+    # save model + feature names, plus what incremental updates need:
+    # rows used (overall and per user), the feature distribution and error of this full fit,
+    # and how many trees belong to it (incremental updates never prune those)
+    meta = {
+        "trained_on_rows": len(X),
+        "user_rows": counts,
+        "mode": "full",
+        "user_id": user_id,
+        "updates_since_full": 0,
+        "base_trees": len(model.estimators_),
+        "base_mae": base_mae,
+        "baseline": {"mean": X.mean(axis=0).tolist(), "std": X.std(axis=0).tolist()},
+    }
+    features = PERSONAL_FEATURES if personal else FEATURES
+    if personal:
+        meta.update(_holdout_check(X, y, owners[0][1], user_id, global_model, global_meta))
+    else:
+        meta["user_holdout_mae"] = _user_holdout_oob(model, y, owners)
+    save_fatigue_model(model, features, save_path, meta)
+
+    print(f"[ml_models] Trained fatigue model on {len(X)} records -> saved to {save_path}")
+    return model, features
+
+def new_training_rows(log_path, since, user_id=None, min_rows=WINDOW_MIN_ROWS, data=None):
+    """
+    Rows added since a previous training run, plus a recent window to fit new trees on.
+    Returns X_new, y_new (new rows only), X_fit, y_fit (new rows topped up with the most
+    recent older rows to at least min_rows) and the new per-user row counts.
+    user_id selects a personal model's rows and features; data - already loaded logs.
+    """
+    personal = user_id is not None
+    width = len(PERSONAL_FEATURES) if personal else len(FEATURES)
+    if data is None:
+        data = _read_logs(log_path)
+    if data is None:
+        empty = np.empty((0, width)), np.empty(0)
+        return empty + empty + (dict(since),)
+    new_parts, old_parts, counts = [], [], {}
+    for uid, ud in _only_user(data, user_id).get("users", {}).items():
+        snap = HistorySnapshot(log_path, uid)
+        counts[uid] = snap.sync(ud.get("history", []))
+        cols, start = snap.columns(), since.get(uid, 0)
+        new_parts.append(_rows_from_columns(cols, start, personal=personal))
+        old_parts.append(_rows_from_columns(cols, 0, start, personal=personal))
+    X_new, y_new, _, _ = _stack(new_parts, width)
+    X_fit, y_fit = X_new, y_new
+    need = min_rows - len(X_new)
+    if len(X_new) and need > 0:
+        X_old, y_old, ts_old, _ = _stack(old_parts, width)
+        recent = np.argsort(ts_old, kind="stable")[-need:]     #latest older rows across all users
+        X_fit, y_fit = np.vstack([X_old[recent], X_new]), np.concatenate([y_old[recent], y_new])
+    return X_new, y_new, X_fit, y_fit, counts
+
+@timed("update_fatigue_model")
+def update_fatigue_model(model, X_fit, y_fit, trees_per_update=10, max_trees=100, base_trees=0):
+    """
+    Grow the forest with trees fit on a recent window (warm start). The first base_trees
+    come from the last full fit on all data and are always kept; above max_trees the
+    oldest incremental trees are pruned so the added trees track recent behaviour.
+    """
+    model.set_params(warm_start=True, oob_score=False, n_estimators=len(model.estimators_) + trees_per_update)
+    model.fit(X_fit, y_fit)                 #warm_start: existing trees are kept, only the new ones are fit
+    if len(model.estimators_) > max_trees:
+        keep = max(max_trees - base_trees, 0)
+        added = model.estimators_[base_trees:]
+        model.estimators_ = model.estimators_[:base_trees] + (added[-keep:] if keep else [])
+        model.n_estimators = len(model.estimators_)
+    return model
 
 def train_fatigue_model(csv_path="C:/Users/Sithumi/src/data/unified/train_data/train.csv", save_path=MODEL_PATH):
     """
@@ -123,11 +380,8 @@ def train_fatigue_model(csv_path="C:/Users/Sithumi/src/data/unified/train_data/t
             y = np.array(y)
             model = RandomForestRegressor(n_estimators=50, random_state=42)  #learn patterns even from very small data
             model.fit(X, y)
-            os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
-            with open(save_path, "wb") as f:
-                pickle.dump((model, ["steps", "sleep_hours", "water_intake", "mood"]), f)
-            with open(MODEL_META, "w", encoding="utf-8") as f:
-                json.dump({"trained_on_rows": len(df)}, f)
+            save_fatigue_model(model, ["steps", "sleep_hours", "water_intake", "mood"], save_path,
+                               {"trained_on_rows": len(df)})
             print(f"[ml_models] Trained fatigue model from CSV -> saved to {save_path}")
             return model, ["steps", "sleep_hours", "water_intake", "mood"]
         except Exception as e:
@@ -137,14 +391,20 @@ def train_fatigue_model(csv_path="C:/Users/Sithumi/src/data/unified/train_data/t
         print("[ml_models] No CSV at path and no sufficient logs; no model trained.")
         return None
 
-def load_fatigue_model(path=MODEL_PATH):
+def load_fatigue_model_with_meta(path=MODEL_PATH):
+    """(model, features, meta) from one pickle read; older pickles without meta fall back to the .meta file."""
     if os.path.exists(path):
         try:
             with open(path, "rb") as f:
-                model, features = pickle.load(f)    #save model to the model path
+                saved = pickle.load(f)    #save model to the model path
             print(f"[ml_models] Loaded fatigue model from {path}")
-            return model, features
+            meta = saved[2] if len(saved) > 2 else read_model_meta(path)
+            return saved[0], saved[1], meta
         except Exception as e:
             print(f"[ml_models] Could not load model: {e}")
-            return None, None
-    return None, None
+            return None, None, {}
+    return None, None, {}
+
+def load_fatigue_model(path=MODEL_PATH):
+    model, features, _ = load_fatigue_model_with_meta(path)
+    return model, features
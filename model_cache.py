@@ -0,0 +1,99 @@
+# model_cache.py
+import os
+import time
+import threading
+from collections import OrderedDict
+from ml_models import load_fatigue_model_with_meta, user_model_path, MODEL_PATH
+
+#In-process LRU cache of loaded fatigue models (global + per-user), so serving
+#many users doesn't keep every pickle resident. Size is measured by the pickle
+#file size, which is a close proxy for a forest's in-memory arrays.
+
+class ModelCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_models=64):
+        self.max_bytes = max_bytes
+        self.max_models = max_models
+        self._models = OrderedDict()     #path -> (model, features, size_bytes, mtime, meta)
+        self._bytes = 0
+        self._lock = threading.Lock()    #streamlit serves sessions from several threads
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "reloads": 0, "load_seconds": 0.0, "max_load_seconds": 0.0}
+
+    def _drop(self, path):
+        entry = self._models.pop(path, None)
+        if entry:
+            self._bytes -= entry[2]
+
+    def get(self, path):
+        """Return (model, features) for a model file, loading it on a miss or after a retrain."""
+        model, features, _ = self.get_with_meta(path)
+        return model, features
+
+    def get_with_meta(self, path):
+        """Like get(), plus the model's training meta (see ml_models.read_model_meta)."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._drop(path)         #model was deleted
+            return None, None, {}
+
+        with self._lock:
+            entry = self._models.get(path)
+            if entry and entry[3] == st.st_mtime and entry[2] == st.st_size:
+                self._models.move_to_end(path)
+                self._stats["hits"] += 1
+                return entry[0], entry[1], entry[4]
+            self._stats["misses"] += 1
+            if entry:
+                self._stats["reloads"] += 1    #file changed on disk (retrained)
+
+        # load outside the lock so one slow load doesn't block other users' hits
+        t0 = time.perf_counter()
+        model, features, meta = load_fatigue_model_with_meta(path)   #model and meta from the same file
+        elapsed = time.perf_counter() - t0
+        if model is None:
+            return None, None, {}
+
+        with self._lock:
+            self._stats["load_seconds"] += elapsed
+            self._stats["max_load_seconds"] = max(self._stats["max_load_seconds"], elapsed)
+            self._drop(path)
+            self._models[path] = (model, features, st.st_size, st.st_mtime, meta)
+            self._bytes += st.st_size
+            # evict least recently used models, but always keep the one just loaded
+            while len(self._models) > 1 and (self._bytes > self.max_bytes or len(self._models) > self.max_models):
+                old_path, _ = next(iter(self._models.items()))
+                self._drop(old_path)
+                self._stats["evictions"] += 1
+        return model, features, meta
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["resident_models"] = len(self._models)
+            s["resident_bytes"] = self._bytes
+            s["avg_load_seconds"] = s["load_seconds"] / s["misses"] if s["misses"] else 0.0
+            return s
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._bytes = 0
+
+
+MODEL_CACHE = ModelCache()    #shared by every HealthCoachAgent in the process
+
+
+def get_fatigue_model(user_id=None, base_path=MODEL_PATH, cache=None):
+    """
+    Personal model for user_id if one has been trained (see ml_models.PERSONAL_MIN_ROWS)
+    and it beat the global model on the user's latest records, otherwise the global model.
+    Returns (model, features, "personal" | "global" | None).
+    """
+    cache = cache or MODEL_CACHE
+    if user_id is not None:
+        model, features, meta = cache.get_with_meta(user_model_path(user_id, base_path))
+        if model is not None and meta.get("beats_global"):
+            return model, features, "personal"
+    model, features = cache.get(base_path)
+    return model, features, ("global" if model is not None else None)
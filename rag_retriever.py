@@ -2,6 +2,7 @@
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import os
+from instrumentation import timed
 
 class RAGRetriever:
     def __init__(self, resources_path="C:/Users/Sithumi/src/data/resources"):
@@ -34,6 +35,7 @@ class RAGRetriever:
         self.vectorizer = TfidfVectorizer()    
         self.doc_vectors = self.vectorizer.fit_transform(self.docs)  #Convert every document into number vectors
 
+    @timed("retrieve")
     def retrieve(self, query, top_k=3): 
         if not self.docs or self.doc_vectors is None:
             return []
@@ -6,6 +6,7 @@ from rag_retriever import RAGRetriever
 from utils import plot_history
 from recommender import recommend_goals
 import re
+from collections import OrderedDict
 
 st.set_page_config(page_title="Personalized Digital Health Coach",
                    page_icon="💡", layout="wide")
@@ -24,6 +25,7 @@ def summarize_text(text, max_chars=400):
 # --------------------- PATHS & INIT ---------------------
 RESOURCES_DIR = "C:/Users/Sithumi/src/data/resources"
 LOG_PATH = "C:/Users/Sithumi/src/data/logs.json"
+TIME_RANGES = {"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "Last year": 365, "All time": None}
 
 user = UserProfile(user_id="sithumi", log_path=LOG_PATH)
 rag = RAGRetriever(resources_path=RESOURCES_DIR)
@@ -118,20 +120,31 @@ with tab2:
     history = user.get_history()
 
     if history:
-        fig_steps, fig_sleep, fig_water = plot_history(history[-21:])
+        rcol1, rcol2 = st.columns(2)
+        range_label = rcol1.selectbox("Time range", list(TIME_RANGES), index=1)
+        rollup = rcol2.selectbox("Aggregation", ["auto", "raw", "daily", "weekly", "monthly"])
+
+        # one chart cache per browser session, so sessions never draw the same Figure concurrently
+        chart_cache = st.session_state.setdefault("chart_cache", OrderedDict())
+        fig_steps, fig_sleep, fig_water = plot_history(user.get_history_frame(days=TIME_RANGES[range_label]),
+                                                       rollup=rollup, cache=chart_cache)
         col1, col2, col3 = st.columns(3)
 
-        with col1:
-            st.write("### 🏃 Steps Trend")
-            st.pyplot(fig_steps, use_container_width=True) #suse_container_width-tretches the content to fill the space
+        if fig_steps is None:
+            st.info("No entries in the selected time range.")
+        else:
+            # figures are cached in this session's chart_cache, so don't let streamlit clear them
+            with col1:
+                st.write("### 🏃 Steps Trend")
+                st.pyplot(fig_steps, use_container_width=True, clear_figure=False) #suse_container_width-tretches the content to fill the space
 
-        with col2:
-            st.write("### 😴 Sleep Trend")
-            st.pyplot(fig_sleep, use_container_width=True)
+            with col2:
+                st.write("### 😴 Sleep Trend")
+                st.pyplot(fig_sleep, use_container_width=True, clear_figure=False)
 
-        with col3:
-            st.write("### 💧 Water Intake Trend")
-            st.pyplot(fig_water, use_container_width=True)
+            with col3:
+                st.write("### 💧 Water Intake Trend")
+                st.pyplot(fig_water, use_container_width=True, clear_figure=False)
 
         st.markdown("### **Last 5 Records**")
         for h in history[-5:][::-1]:
@@ -148,7 +161,7 @@ with tab2:
 # --------------------- FOOTER ---------------------
 st.write("---")
 st.markdown("""
-**Privacy notice:** This health coach prototype collects and stores your personal activity data (steps, sleep, water intake, mood) locally in data/logs.json. 
+**Privacy notice:** This health coach prototype collects and stores your personal activity data (steps, sleep, water intake, mood) locally in the data folder: logs.json, plus derived copies in data/logs.json.snapshots/ (chart/training columns), data/logs.json.journal* files (pending bulk imports) and data/models/ (fatigue models trained on your entries).
 - Your data is kept private and is not shared externally.
-- You can delete your data anytime by removing the logs.json file.
+- You can delete your data anytime by removing logs.json together with the logs.json.journal* files, logs.json.snapshots/ and models/. Snapshots of users no longer in logs.json are removed automatically the next time the app starts.
 """)
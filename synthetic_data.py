@@ -0,0 +1,36 @@
+# synthetic_data.py
+import csv
+import datetime
+import numpy as np
+
+#Synthetic daily log entries shared by benchmark_suite.py and benchmark_training.py,
+#so both benchmarks draw from the same distributions.
+
+MOODS = ["Happy", "Okay", "Sad", "Stressed", "Tired"]
+
+
+def synthetic_entry(rng, ts):
+    """One history entry at datetime ts (same fields as UserProfile.update_today)."""
+    return {
+        "timestamp": ts.isoformat(),
+        "steps": int(max(0, rng.normal(7000, 2500))),
+        "sleep": round(float(np.clip(rng.normal(7, 1.2), 0, 24)), 2),
+        "water": round(float(np.clip(rng.normal(1.8, 0.5), 0, 10)), 2),
+        "mood": MOODS[int(rng.integers(len(MOODS)))],
+    }
+
+
+def simulated_day(rng, day, user_ids, start):
+    """{user_id: [entry]} for day number `day` after start, one entry per user."""
+    ts = start + datetime.timedelta(days=day)
+    return {uid: [synthetic_entry(rng, ts)] for uid in user_ids}
+
+
+def write_synthetic_csv(path, rng, user_ids, n_rows, start, step=datetime.timedelta(minutes=1)):
+    """Wearable-style CSV export (user_id, timestamp, steps, sleep, water, mood) for bulk_import."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["user_id", "timestamp", "steps", "sleep", "water", "mood"])
+        for i in range(n_rows):
+            e = synthetic_entry(rng, start + i * step)
+            w.writerow([user_ids[i % len(user_ids)], e["timestamp"], e["steps"], e["sleep"], e["water"], e["mood"]])
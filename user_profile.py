@@ -3,6 +3,9 @@ import os
 import json
 import datetime
 from continuous_learning import retrain_if_needed
+from history_store import (HistorySnapshot, merge_journal, release_journal, clear_compacted, prune_snapshots,
+                           JOURNAL_DONE_KEY)
+from instrumentation import timed
 
 class UserProfile:
     def __init__(self, user_id="user_1", log_path="C:/Users/Sithumi/src/data/logs.json"):
@@ -15,24 +18,50 @@ class UserProfile:
                 json.dump({"users": {self.user_id: {"history": [], "goals": {}}}}, f, indent=2)  #dump=save
         with open(log_path, "r", encoding="utf-8") as f:
             self.data = json.load(f)
+        self._journal_segments = []
         if "users" not in self.data:
             old_history = self.data.get("history", [])
             self.data = {"users": {self.user_id: {"history": old_history, "goals": {}}}}
             self._save()
+        clear_compacted(self.data, log_path)      #segments a previous save folded in but didn't get to delete
+        self._journal_segments = merge_journal(self.data, log_path, seal=True)   #rows from bulk imports not yet in logs.json
         if self.user_id not in self.data["users"]:
             self.data["users"][self.user_id] = {"history": [], "goals": {}}
             self._save()
         self.default_goals = {"steps": 8000, "sleep": 7.5, "water": 2.0}  #if no goals are set for the user,system use these as default(at user's first time entry)
+        self.snapshot = HistorySnapshot(log_path, self.user_id)   #columnar copy of this user's history for charts/training
+        prune_snapshots(log_path, self.data["users"])              #copies of users removed from logs.json go too
+        self._sync_snapshot(self.user_id)
 
+    @timed("profile_save")
     def _save(self):
+        # logs.json names the journal segments it now contains, so a crash before they are
+        # deleted doesn't merge them twice; only segments this profile merged are deleted
+        self.data[JOURNAL_DONE_KEY] = [name for name, _ in self._journal_segments]
         with open(self.log_path, "w", encoding="utf-8") as f:
             json.dump(self.data, f, indent=2, default=str)
+        release_journal(self.log_path, self._journal_segments)
+        self._journal_segments = []
+
+    def compact(self):
+        """Fold pending bulk-import journal rows into logs.json with a single write."""
+        self._save()
+
+    @timed("snapshot_sync")
+    def _sync_snapshot(self, user_id):
+        # snapshot failures must never block saving logs; it is rebuilt from logs.json next time
+        try:
+            snap = self.snapshot if user_id == self.user_id else HistorySnapshot(self.log_path, user_id)
+            snap.sync(self.data["users"][user_id]["history"])
+        except Exception as e:
+            print(f"[UserProfile] snapshot sync failed for {user_id}: {e}")
 
     def update_today(self, steps, sleep, water, mood):
         ts = datetime.datetime.utcnow().isoformat()   #utcnow-give current universal time,isoformat-makes it human-readable and storable in JSON.
         entry = {"timestamp": ts, "steps": int(steps), "sleep": float(sleep), "water": float(water), "mood": mood}
         self.data["users"][self.user_id]["history"].append(entry)
         self._save()
+        self._sync_snapshot(self.user_id)
 
         # after saving, consider retraining the personal model
         try:
@@ -42,6 +71,27 @@ class UserProfile:
 
         return entry
 
+    def add_entries(self, entries_by_user):
+        """
+        Append already-validated entries for one or more users and save once.
+        entries_by_user: {user_id: [entry, ...]}. Does not trigger retraining.
+        Used to seed stores with generated data (benchmark_suite, benchmark_training);
+        file imports go through bulk_import and the journal instead.
+        """
+        added = 0
+        for uid, entries in entries_by_user.items():
+            if not entries:
+                continue
+            ud = self.data["users"].setdefault(uid, {"history": [], "goals": {}})
+            ud["history"].extend(entries)
+            added += len(entries)
+        if added:
+            self._save()       #one write for the whole batch instead of one per entry
+            for uid, entries in entries_by_user.items():
+                if entries:
+                    self._sync_snapshot(uid)
+        return added
+
     def get_history(self, days=None):
         hist = self.data["users"][self.user_id]["history"]
         if not days:
@@ -57,6 +107,11 @@ class UserProfile:
                 continue
         return filtered
 
+    def get_history_frame(self, days=None):
+        """Same rows as get_history, as a DataFrame read from the columnar snapshot."""
+        self._sync_snapshot(self.user_id)
+        return self.snapshot.frame(days=days)
+
     def set_goal(self, key, value):      #Update a specific goal for the user
         self.data["users"][self.user_id]["goals"][key] = value
         self._save()
@@ -1,51 +1,119 @@
 # utils.py
+import hashlib                     #cache key for already-rendered charts
+import threading                   #streamlit serves sessions from several threads
+from collections import OrderedDict
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure   #figures not tracked by pyplot, so they are freed once unused
 import pandas as pd                #handling dates and tabular data
 import matplotlib.dates as mdates  #formatting dates on the x axis
 
-def plot_history(history):
-    if not history:
+MAX_POINTS = 120          #above this many points, "auto" switches to a coarser rollup
+ROLLUPS = {"daily": "D", "weekly": "W", "monthly": "MS"}
+ROLLUP_DAYS = {"daily": 1, "weekly": 7, "monthly": 30}
+_CHART_CACHE_SIZE = 8     #recent (history, rollup) combinations kept rendered
+_chart_cache = OrderedDict()   #shared default; streamlit passes one cache per session instead
+_chart_lock = threading.Lock()
+
+
+def _to_frame(history):
+    if isinstance(history, pd.DataFrame):
+        df = history
+    else:
+        df = pd.DataFrame(history)
+        # Convert timestamp
+        df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce", utc=False)
+    df = df[["timestamp", "steps", "sleep", "water"]].dropna(subset=["timestamp"])
+    return df.sort_values("timestamp")
+
+
+def _history_key(df, rollup):
+    h = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    h.update(rollup.encode())
+    return h.hexdigest()
+
+
+def _pick_rollup(df, rollup):
+    if rollup != "auto":
+        return rollup
+    if len(df) <= MAX_POINTS:
+        return "raw"
+    span_days = (df["timestamp"].iloc[-1] - df["timestamp"].iloc[0]).days + 1
+    for name in ("daily", "weekly", "monthly"):
+        if span_days / ROLLUP_DAYS[name] <= MAX_POINTS:
+            return name
+    return "monthly"
+
+
+def rollup_history(df, rollup):
+    """Aggregate to daily/weekly/monthly mean with min/max per bucket ("raw" returns df unchanged)."""
+    if rollup == "raw":
+        return df
+    agg = df.set_index("timestamp").resample(ROLLUPS[rollup]).agg(["mean", "min", "max"])
+    agg = agg.dropna(how="all")
+    agg.columns = [f"{col}_{stat}" if stat != "mean" else col for col, stat in agg.columns]
+    return agg.reset_index()
+
+
+def _trend_chart(df, col, avg, figsize, title, ylabel, line_label, avg_label, small=False):
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots()
+    ax.plot(df["timestamp"], df[col], linewidth=1.6 if small else 1.8, label=line_label)
+    if f"{col}_min" in df:
+        # min/max band for each rolled-up bucket
+        ax.fill_between(df["timestamp"], df[f"{col}_min"], df[f"{col}_max"], alpha=0.2, linewidth=0)
+    ax.axhline(avg, color="red", linestyle="--", linewidth=1, label=avg_label)
+    ax.set_title(title, fontsize=9 if small else 10)
+    ax.set_ylabel(ylabel, fontsize=8 if small else 9)
+    ax.grid(True, alpha=0.25)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+    plt.setp(ax.get_xticklabels(), rotation=30, fontsize=7 if small else 8, ha="right")
+    ax.legend(fontsize=7 if small else 8)
+    return fig
+
+
+def plot_history(history, rollup="auto", cache=None):
+    """
+    history - list of log dicts, or a DataFrame from UserProfile.get_history_frame.
+    rollup - "auto", "raw", "daily", "weekly" or "monthly".
+    cache - OrderedDict to keep rendered figures in (default: module-wide cache).
+    Rendered figures are cached by a hash of the history, so Streamlit reruns reuse them.
+    Figure objects are not thread-safe: give each Streamlit session its own cache so the
+    same Figure is never drawn by two sessions at once.
+    """
+    if cache is None:
+        cache = _chart_cache
+    if history is None or len(history) == 0:
         return None, None, None
 
-    df = pd.DataFrame(history)
-    # Convert timestamp 
-    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce", utc=False, infer_datetime_format=True)
-    df = df.sort_values("timestamp")
+    df = _to_frame(history)
+    if df.empty:
+        return None, None, None
 
-    # --------------------------- 1. STEPS ---------------------------
-    fig_steps, ax1 = plt.subplots(figsize=(5.5, 2.4))
-    ax1.plot(df["timestamp"], df["steps"], linewidth=1.8, label="Step Count")
-    avg_steps = df["steps"].mean()
-    ax1.axhline(avg_steps, color="red", linestyle="--", linewidth=1, label=f"Avg: {avg_steps:.0f}")
-    ax1.set_title("Daily Steps Trend", fontsize=10)
-    ax1.set_ylabel("Steps", fontsize=9)
-    ax1.grid(True, alpha=0.25)
-    ax1.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-    plt.setp(ax1.get_xticklabels(), rotation=30, fontsize=8, ha="right")
-    ax1.legend(fontsize=8)
+    key = _history_key(df, rollup)
+    with _chart_lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
 
-    # --------------------------- 2. SLEEP ---------------------------
-    fig_sleep, ax2 = plt.subplots(figsize=(5.5, 2.4))
-    ax2.plot(df["timestamp"], df["sleep"], linewidth=1.8, label="Sleep Hours")
-    avg_sleep = df["sleep"].mean()
-    ax2.axhline(avg_sleep, color="red", linestyle="--", linewidth=1, label=f"Avg: {avg_sleep:.1f}h")
-    ax2.set_title("Sleep Duration (Hours)", fontsize=10)
-    ax2.set_ylabel("Hours", fontsize=9)
-    ax2.grid(True, alpha=0.25)
-    ax2.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-    plt.setp(ax2.get_xticklabels(), rotation=30, fontsize=8, ha="right")
-    ax2.legend(fontsize=8)
+    # averages come from the raw values, not the rolled-up buckets
+    avg_steps, avg_sleep, avg_water = df["steps"].mean(), df["sleep"].mean(), df["water"].mean()
+    level = _pick_rollup(df, rollup)
+    plot_df = rollup_history(df, level)
+    suffix = "" if level == "raw" else f" ({level})"
 
+    # --------------------------- 1. STEPS ---------------------------
+    fig_steps = _trend_chart(plot_df, "steps", avg_steps, (5.5, 2.4), "Daily Steps Trend" + suffix,
+                             "Steps", "Step Count", f"Avg: {avg_steps:.0f}")
+    # --------------------------- 2. SLEEP ---------------------------
+    fig_sleep = _trend_chart(plot_df, "sleep", avg_sleep, (5.5, 2.4), "Sleep Duration (Hours)" + suffix,
+                             "Hours", "Sleep Hours", f"Avg: {avg_sleep:.1f}h")
     # --------------------------- 3. WATER ---------------------------
-    fig_water, ax3 = plt.subplots(figsize=(4.5, 1.9))
-    ax3.plot(df["timestamp"], df["water"], linewidth=1.6, label="Water Intake")
-    avg_water = df["water"].mean()
-    ax3.axhline(avg_water, color="red", linestyle="--", linewidth=1, label=f"Avg: {avg_water:.1f}L")
-    ax3.set_title("Daily Water Intake (Liters)", fontsize=9)
-    ax3.set_ylabel("Liters", fontsize=8)
-    ax3.grid(True, alpha=0.25)
-    ax3.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-    plt.setp(ax3.get_xticklabels(), rotation=30, fontsize=7, ha="right")
-    ax3.legend(fontsize=7)
-
-    return fig_steps, fig_sleep, fig_water
+    fig_water = _trend_chart(plot_df, "water", avg_water, (4.5, 1.9), "Daily Water Intake (Liters)" + suffix,
+                             "Liters", "Water Intake", f"Avg: {avg_water:.1f}L", small=True)
+
+    figs = (fig_steps, fig_sleep, fig_water)
+    with _chart_lock:
+        cache[key] = figs
+        if len(cache) > _CHART_CACHE_SIZE:
+            cache.popitem(last=False)    #oldest charts are dropped and garbage collected
+    return figs